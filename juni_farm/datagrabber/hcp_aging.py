@@ -3,18 +3,36 @@
 # Authors: Leonard Sasse <l.sasse@fz-juelich.de>
 # License: AGPL
 
-from itertools import product
+import os
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
+
+from juni_farm_hcp_common import HCPElementsMixin, parse_choices
 
 from junifer.datagrabber.datalad_base import DataladDataGrabber
 from junifer.api.decorators import register_datagrabber
 from junifer.datagrabber import PatternDataGrabber
-from junifer.utils import raise_error
+
+
+# All tasks and phase encodings, ordered as used for the defaults
+_ALL_TASKS = ("REST1", "REST2", "CARIT", "FACENAME", "VISMOTOR")
+_ALL_PHASE_ENCODINGS = ("AP", "PA")
+
+
+def junifer_module_deps() -> List[str]:
+    """Return the dependencies of the module.
+
+    Returns
+    -------
+    List[str]
+        The list of dependencies.
+
+    """
+    return ["juni_farm_hcp_common.py"]
 
 
 @register_datagrabber
-class HCPAging(PatternDataGrabber):
+class HCPAging(HCPElementsMixin, PatternDataGrabber):
     """Concrete implementation for HCP Aging dataset.
 
     Parameters
@@ -41,9 +59,6 @@ class HCPAging(PatternDataGrabber):
         **kwargs,
     ) -> None:
         """Initialise the class."""
-        # all tasks
-
-        all_tasks = ["REST1", "REST2", "CARIT", "FACENAME", "VISMOTOR"]
         patterns = {
             "BOLD": (
                 "{subject}_V1_MR/MNINonLinear/"
@@ -53,44 +68,22 @@ class HCPAging(PatternDataGrabber):
         }
         types = list(patterns.keys())
 
-        # Set default tasks
-        if tasks is None:
-            self.tasks: List[str] = all_tasks
-        # Convert single task into list
-        else:
-            if not isinstance(tasks, List):
-                tasks = [tasks]
-
-            # Check for invalid task(s)
-            for task in tasks:
-                if task not in all_tasks:
-                    raise_error(
-                        f"'{task}' is not a valid HCP-Aging fMRI task input. "
-                        f"Valid task values can be any or all of {all_tasks}."
-                    )
-            self.tasks: List[str] = tasks
-
-        # All phase encodings
-        all_phase_encodings = ["AP", "PA"]
-
-        # Set phase encodings
-        if phase_encodings is None:
-            phase_encodings = all_phase_encodings
-
-        # Convert single phase encoding into list
-        if isinstance(phase_encodings, str):
-            phase_encodings = [phase_encodings]
-
-        # Check for invalid phase encoding(s)
-        for pe in phase_encodings:
-            if pe not in all_phase_encodings:
-                raise_error(
-                    f"'{pe}' is not a valid HCP-Aging phase encoding. "
-                    "Valid phase encoding can be any or all of "
-                    f"{all_phase_encodings}."
-                )
-
-        self.phase_encodings = phase_encodings
+        self.tasks: List[str] = parse_choices(
+            tasks, _ALL_TASKS, "fMRI task", "HCP-Aging"
+        )
+
+        self.phase_encodings: List[str] = parse_choices(
+            phase_encodings,
+            _ALL_PHASE_ENCODINGS,
+            "phase encoding",
+            "HCP-Aging",
+        )
+
+        # Map tasks to their naming in the dataset
+        self._task_map = {
+            task: f"rfMRI_{task}" if "REST" in task else f"tfMRI_{task}"
+            for task in _ALL_TASKS
+        }
 
         # The replacements
         replacements = ["subject", "task", "phase_encoding"]
@@ -120,37 +113,30 @@ class HCPAging(PatternDataGrabber):
             Dictionary of paths for each type of data required for the
             specified element.
         """
-        # Resting task
-        if "REST" in task:
-            new_task = f"rfMRI_{task}"
-        else:
-            new_task = f"tfMRI_{task}"
-
         out = super().get_item(
-            subject=subject, task=new_task, phase_encoding=phase_encoding
+            subject=subject,
+            task=self._task_map[task],
+            phase_encoding=phase_encoding,
         )
         return out
 
-    def get_elements(self) -> List:
-        """Implement fetching list of elements in the dataset.
+    def _subject_from_entry(self, entry: os.DirEntry) -> Optional[str]:
+        """Get the subject ID of an entry in the data directory.
+
+        Parameters
+        ----------
+        entry : os.DirEntry
+            The entry in the data directory.
 
         Returns
         -------
-        list
-            The list of elements in the dataset.
+        str or None
+            The subject ID, or None if the entry is not a subject.
+
         """
-        subjects = [
-            x.name.split("_")[0]
-            for x in self.datadir.iterdir()
-            if "V1_MR" in x.name
-        ]
-
-        return [
-            (sub, task, phase_encoding)
-            for sub, task, phase_encoding in product(
-                subjects, self.tasks, self.phase_encodings
-            )
-        ]
+        if "V1_MR" in entry.name:
+            return entry.name.split("_")[0]
+        return None
 
     @property
     def skip_file_check(self) -> bool:
@@ -196,10 +182,3 @@ class DataladHCPAging(DataladDataGrabber, HCPAging):
             phase_encodings=phase_encodings,
             uri=uri,
         )
-
-
-if __name__ == "__main__":
-    with DataladHCPAging() as dg:
-        elems = dg.get_elements()
-        test_data = dg[elems[0]]
-        print(test_data)
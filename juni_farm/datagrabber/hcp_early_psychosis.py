@@ -3,56 +3,40 @@
 # Authors: Leonard Sasse <l.sasse@fz-juelich.de>
 # License: AGPL
 
-from itertools import product
+import os
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
+
+from juni_farm_hcp_common import (
+    HCPElementsMixin,
+    get_cat_to_fmriprep_mapping,
+    parse_choices,
+)
 
 from junifer.datagrabber.datalad_base import DataladDataGrabber
 from junifer.api.decorators import register_datagrabber
 from junifer.datagrabber import PatternDataGrabber
-from junifer.utils import raise_error
 
 
-def get_cat_to_fmriprep_mapping():
-    """Map variables in CAT output to fmriprep variables.
+# All tasks and phase encodings, ordered as used for the defaults
+_ALL_TASKS = ("REST1", "REST2")
+_ALL_PHASE_ENCODINGS = ("AP", "PA")
+
+
+def junifer_module_deps() -> List[str]:
+    """Return the dependencies of the module.
 
     Returns
     -------
-    dict
-        keys (CAT variables) and values (corresponding fMRIprep variables).
+    List[str]
+        The list of dependencies.
 
     """
-    # overarching variables
-    terms_cat = ["WM", "CSF", "GS"]
-    terms_fmriprep = ["white_matter", "csf", "global_signal"]
-
-    mapping = {}
-
-    for cat, fmriprep in zip(terms_cat, terms_fmriprep):
-        mapping[cat] = fmriprep
-        mapping[f"{cat}^2"] = f"{fmriprep}_power2"
-
-    # take care of motion parameters
-    # TODO: Felix' dataset uses rigid body parameters 1 to 6 but i am not sure
-    # which number (1-6) correspnds to translations and rotations (and x, y, z)
-    # respectively; for regular confound removal this should not matter
-    # because all confounds will be selected and used in the regression
-    # but will be good to have this implemented correctly anyways
-    motion_terms_fmriprep = ["rot", "trans"]
-    motion_directions = ["x", "y", "z"]
-    for i_iter, (term, direction) in enumerate(
-        product(motion_terms_fmriprep, motion_directions)
-    ):
-        mapping[f"RP.{i_iter+1}"] = f"{term}_{direction}"
-        mapping[f"RP^2.{i_iter+1}"] = f"{term}_{direction}_power2"
-        mapping[f"DRP.{i_iter+1}"] = f"{term}_{direction}_derivative1"
-        mapping[f"DRP^2.{i_iter+1}"] = f"{term}_{direction}_derivative1_power2"
-
-    return mapping
+    return ["juni_farm_hcp_common.py"]
 
 
 @register_datagrabber
-class HCPEarlyPsychosis(PatternDataGrabber):
+class HCPEarlyPsychosis(HCPElementsMixin, PatternDataGrabber):
     """Concrete implementation for HCP Early Psychosis dataset.
 
     Parameters
@@ -79,8 +63,6 @@ class HCPEarlyPsychosis(PatternDataGrabber):
         **kwargs,
     ) -> None:
         """Initialise the class."""
-        # all tasks
-        all_tasks = ["REST1", "REST2"]
         patterns = {
             "BOLD": (
                 "{subject}_01_MR/MNINonLinear/"
@@ -95,45 +77,18 @@ class HCPEarlyPsychosis(PatternDataGrabber):
         }
         types = list(patterns.keys())
 
-        # Set default tasks
-        if tasks is None:
-            self.tasks: List[str] = all_tasks
-        # Convert single task into list
-        else:
-            if not isinstance(tasks, List):
-                tasks = [tasks]
-
-            # Check for invalid task(s)
-            for task in tasks:
-                if task not in all_tasks:
-                    raise_error(
-                        f"'{task}' is not a valid HCP Early Psychosis"
-                        " fMRI task input. "
-                        f"Valid task values can be any or all of {all_tasks}."
-                    )
-            self.tasks: List[str] = tasks
-
-        # All phase encodings
-        all_phase_encodings = ["AP", "PA"]
-
-        # Set phase encodings
-        if phase_encodings is None:
-            phase_encodings = all_phase_encodings
-
-        # Convert single phase encoding into list
-        if isinstance(phase_encodings, str):
-            phase_encodings = [phase_encodings]
-
-        # Check for invalid phase encoding(s)
-        for pe in phase_encodings:
-            if pe not in all_phase_encodings:
-                raise_error(
-                    f"'{pe}' is not a valid HCP Early Psychosis "
-                    "phase encoding. Valid phase encoding can be"
-                    f" any or all of {all_phase_encodings}."
-                )
-
-        self.phase_encodings = phase_encodings
+        self.tasks: List[str] = parse_choices(
+            tasks,
+            _ALL_TASKS,
+            "fMRI task",
+            "HCP Early Psychosis",
+        )
+        self.phase_encodings: List[str] = parse_choices(
+            phase_encodings,
+            _ALL_PHASE_ENCODINGS,
+            "phase encoding",
+            "HCP Early Psychosis",
+        )
 
         # The replacements
         replacements = ["subject", "task", "phase_encoding"]
@@ -171,26 +126,23 @@ class HCPEarlyPsychosis(PatternDataGrabber):
         }
         return out
 
-    def get_elements(self) -> List:
-        """Implement fetching list of elements in the dataset.
+    def _subject_from_entry(self, entry: os.DirEntry) -> Optional[str]:
+        """Get the subject ID of an entry in the data directory.
+
+        Parameters
+        ----------
+        entry : os.DirEntry
+            The entry in the data directory.
 
         Returns
         -------
-        list
-            The list of elements in the dataset.
+        str or None
+            The subject ID, or None if the entry is not a subject.
+
         """
-        subjects = [
-            x.name.split("_")[0]
-            for x in self.datadir.iterdir()
-            if "01_MR" in x.name
-        ]
-
-        return [
-            (sub, task, phase_encoding)
-            for sub, task, phase_encoding in product(
-                subjects, self.tasks, self.phase_encodings
-            )
-        ]
+        if "01_MR" in entry.name:
+            return entry.name.split("_")[0]
+        return None
 
     @property
     def skip_file_check(self) -> bool:
@@ -235,11 +187,3 @@ class DataladHCPEarlyPsychosis(DataladDataGrabber, HCPEarlyPsychosis):
             phase_encodings=phase_encodings,
             uri=uri,
         )
-
-
-if __name__ == "__main__":
-    with DataladHCPEarlyPsychosis() as dg:
-        elems = dg.get_elements()
-        print(elems)
-        test_data = dg[elems[0]]
-        print(test_data)
@@ -1,12 +1,30 @@
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence
 
 import nibabel as nib
-import pandas as pd
+from nibabel.openers import ImageOpener
+from nibabel.volumeutils import array_to_file
+import numpy as np
 from hcp_ya_confounds_cat import MultipleHCP
 
 from junifer.api.decorators import register_datagrabber
 from junifer.pipeline import WorkDirManager
-from junifer.utils import logger
+from junifer.utils import logger, raise_error
+
+
+# The tasks and phase encodings that are concatenated, in that order
+_ALL_TASKS = (
+    "SOCIAL",
+    "WM",
+    "RELATIONAL",
+    "EMOTION",
+    "LANGUAGE",
+    "GAMBLING",
+    "MOTOR",
+)
+_ALL_PE = ("LR", "RL")
+_TASK_PE = tuple((task, pe) for task in _ALL_TASKS for pe in _ALL_PE)
 
 
 def junifer_module_deps() -> List[str]:
@@ -18,7 +36,118 @@ def junifer_module_deps() -> List[str]:
         The list of dependencies.
 
     """
-    return ["hcp_ya_confounds_cat.py"]
+    return ["juni_farm_hcp_common.py", "hcp_ya_confounds_cat.py"]
+
+
+def _concat_bolds(paths: Sequence[Path], fname: Path) -> None:
+    """Concatenate 4D images along time, one image at a time.
+
+    Parameters
+    ----------
+    paths : sequence of pathlib.Path
+        The paths of the images to concatenate.
+    fname : pathlib.Path
+        The path to save the concatenated image to.
+
+    Raises
+    ------
+    ValueError
+        If the images are not 4D or do not share the spatial shape and
+        affine of the first image.
+
+    Notes
+    -----
+    NIfTI stores the time axis last and varying slowest, so concatenating
+    along time amounts to writing the data of each image one after the
+    other. Only one image is held in memory at a time and the data keeps
+    its stored dtype, unless an image is scaled, in which case float32 is
+    written.
+
+    """
+    # Only the headers are read here, the data stays on disk
+    first = nib.load(paths[0])
+    if first.ndim != 4:
+        raise_error(f"{paths[0]} is not a 4D image, cannot concatenate.")
+    imgs = [first]
+    for path in paths[1:]:
+        img = nib.load(path)
+        if (
+            img.ndim != 4
+            or img.shape[:3] != first.shape[:3]
+            or not np.allclose(img.affine, first.affine)
+        ):
+            raise_error(
+                f"{path} does not match the 4D geometry of {paths[0]}, "
+                "cannot concatenate."
+            )
+        imgs.append(img)
+    if any((img.dataobj.slope, img.dataobj.inter) != (1, 0) for img in imgs):
+        dtype = np.float32
+    else:
+        dtype = np.result_type(*(img.get_data_dtype() for img in imgs))
+
+    header = first.header.copy()
+    header.set_data_shape(
+        (*first.shape[:3], sum(img.shape[3] for img in imgs))
+    )
+    header.set_data_dtype(dtype)
+    header.set_slope_inter(1, 0)
+    # Let nibabel place the data right after the header and extensions
+    header.set_data_offset(0)
+    with ImageOpener(fname, "wb") as fobj:
+        header.write_to(fobj)
+        for img in imgs:
+            array_to_file(
+                np.asanyarray(img.dataobj),
+                fobj,
+                out_dtype=header.get_data_dtype(),
+                offset=None,
+            )
+
+
+def _concat_confounds(paths: Sequence[Path], fname: Path) -> None:
+    """Concatenate TSV confound files row-wise.
+
+    Parameters
+    ----------
+    paths : sequence of pathlib.Path
+        The paths of the confound files to concatenate.
+    fname : pathlib.Path
+        The path to save the concatenated confounds to.
+
+    Raises
+    ------
+    ValueError
+        If the first file is empty or the header of a file differs from the
+        header of the first file.
+
+    Notes
+    -----
+    The files are stitched as text: the header of the first file is kept
+    and the rows of every file are appended, so values are not parsed or
+    reformatted. Line endings are normalised to LF.
+
+    """
+    header = None
+    with open(fname, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                t_header = f.readline().rstrip(b"\r\n")
+                rows = f.read().replace(b"\r\n", b"\n")
+            if header is None:
+                if not t_header:
+                    raise_error(f"{path} has no header, cannot concatenate.")
+                header = t_header
+                out.write(header + b"\n")
+            elif t_header != header:
+                raise_error(
+                    f"Confounds in {path} do not have the same columns as "
+                    f"{paths[0]}, cannot concatenate."
+                )
+            out.write(rows)
+            # Keep the next file's first row on its own line
+            if rows and not rows.endswith(b"\n"):
+                out.write(b"\n")
 
 
 @register_datagrabber
@@ -29,73 +158,63 @@ class HCP_YA_Concatenated(MultipleHCP):
     ----------
     datadir : str or Path, optional
         The directory where the datalad dataset will be cloned.
+    max_workers : int, optional
+        The number of runs of a subject to fetch in parallel. The runs of a
+        subject live in the same datalad subdataset, so fetching them in
+        parallel can race on installing it if it is not present yet
+        (default 1).
+    compress_output : bool, optional
+        Whether to gzip the concatenated BOLD image. The image is only an
+        intermediate file in the element's temporary directory, so it is
+        written uncompressed by default to skip the costly compression
+        (default False).
     **kwargs
         Keyword arguments passed to superclass.
 
     """
 
-    def __init__(self, **kwargs):
+    def __init__(
+        self, max_workers: int = 1, compress_output: bool = False, **kwargs
+    ):
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise_error(
+                f"max_workers must be a positive integer, got {max_workers!r}."
+            )
+        self.max_workers = max_workers
+        self.compress_output = compress_output
         super().__init__(
             tasks=None, phase_encodings=None, ica_fix=False, **kwargs
         )
 
     def get_elements(self) -> List[str]:
-        all_elements = super().get_elements()
-        return list({element[0] for element in all_elements})
+        return list({element[0] for element in super().get_elements()})
 
     def __getitem__(self, subject: str) -> Dict:
-        all_data = []
-        all_tasks = [
-            "SOCIAL",
-            "WM",
-            "RELATIONAL",
-            "EMOTION",
-            "LANGUAGE",
-            "GAMBLING",
-            "MOTOR",
+        elements = [(subject, task, pe) for task, pe in _TASK_PE]
+        # Fetching is I/O bound, so threads can overlap the datalad gets
+        getter = super().__getitem__
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                all_data = list(executor.map(getter, elements))
+        else:
+            all_data = [getter(element) for element in elements]
+
+        all_bolds = [data["BOLD"]["path"] for data in all_data]
+        all_confounds = [
+            data["BOLD"]["confounds"]["path"] for data in all_data
         ]
-        all_pe = ["LR", "RL"]
-        for task in all_tasks:
-            for pe in all_pe:
-                all_data.append(super().__getitem__((subject, task, pe)))
-
-        all_bolds = []
-        all_confounds = []
-        for data in all_data:
-            all_bolds.append(data["BOLD"]["path"])
-            all_confounds.append(data["BOLD"]["confounds"]["path"])
-
-        logger.info("Concatenating BOLD images and confounds")
-        concat_img = nib.concat_images(all_bolds, axis=3)
-        concat_confounds = pd.concat(
-            [pd.read_csv(conf, sep="\t") for conf in all_confounds]
-        )
-        logger.info("Saving concatenated BOLD images and confounds")
+
         tmpdir = WorkDirManager().get_element_tempdir(prefix="hcp_ya_concat")
-        concat_bold_fname = tmpdir / "concat_bold.nii.gz"
+        suffix = ".nii.gz" if self.compress_output else ".nii"
+        concat_bold_fname = tmpdir / f"concat_bold{suffix}"
         concat_confounds_fname = tmpdir / "concat_confounds.tsv"
-        nib.save(concat_img, concat_bold_fname)
-        concat_confounds.to_csv(concat_confounds_fname, sep="\t", index=False)
+        logger.info("Concatenating BOLD images")
+        _concat_bolds(all_bolds, concat_bold_fname)
+        logger.info("Concatenating confounds")
+        _concat_confounds(all_confounds, concat_confounds_fname)
 
         new_data = all_data[0].copy()
         new_data["BOLD"]["path"] = concat_bold_fname
         new_data["BOLD"]["confounds"]["path"] = concat_confounds_fname
         new_data["BOLD"]["meta"]["element"] = {"subject": subject}
         return new_data
-
-
-if __name__ == "__main__":
-    from junifer.utils import configure_logging
-
-    configure_logging(level="INFO")
-    with HCP_YA_Concatenated() as hcp_concat:
-        all_elements = hcp_concat.get_elements()
-
-        # this will run over all elements, so use keyboard interrupt
-        # if convinced that it works
-        for element in all_elements[:1]:
-            print(element)
-
-        element = "100307"
-        out = hcp_concat[element]
-        print(out)
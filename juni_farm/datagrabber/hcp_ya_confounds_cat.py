@@ -4,10 +4,17 @@
 # License: AGPL
 
 from itertools import product
+import os
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 import warnings
 
+from juni_farm_hcp_common import (
+    HCPElementsMixin,
+    get_cat_to_fmriprep_mapping,
+    parse_choices,
+)
+
 from junifer.api.decorators import register_datagrabber
 from junifer.datagrabber import (
     DataladDataGrabber,
@@ -15,49 +22,37 @@ from junifer.datagrabber import (
     MultipleDataGrabber,
     PatternDataladDataGrabber,
 )
-from junifer.utils import raise_error
 
 
-def get_cat_to_fmriprep_mapping():
-    """Map variables in CAT output to fmriprep variables.
+# All tasks and phase encodings, ordered as used for the defaults
+_ALL_TASKS = (
+    "REST1",
+    "REST2",
+    "SOCIAL",
+    "WM",
+    "RELATIONAL",
+    "EMOTION",
+    "LANGUAGE",
+    "GAMBLING",
+    "MOTOR",
+)
+_ALL_PHASE_ENCODINGS = ("LR", "RL")
+
+
+def junifer_module_deps() -> List[str]:
+    """Return the dependencies of the module.
 
     Returns
     -------
-    dict
-        keys (CAT variables) and values (corresponding fMRIprep variables).
+    List[str]
+        The list of dependencies.
 
     """
-    # overarching variables
-    terms_cat = ["WM", "CSF", "GS"]
-    terms_fmriprep = ["white_matter", "csf", "global_signal"]
-
-    mapping = {}
-
-    for cat, fmriprep in zip(terms_cat, terms_fmriprep):
-        mapping[cat] = fmriprep
-        mapping[f"{cat}^2"] = f"{fmriprep}_power2"
-
-    # take care of motion parameters
-    # TODO: Felix' dataset uses rigid body parameters 1 to 6 but i am not sure
-    # which number (1-6) correspnds to translations and rotations (and x, y, z)
-    # respectively; for regular confound removal this should not matter
-    # because all confounds will be selected and used in the regression
-    # but will be good to have this implemented correctly anyways
-    motion_terms_fmriprep = ["rot", "trans"]
-    motion_directions = ["x", "y", "z"]
-    for i_iter, (term, direction) in enumerate(
-        product(motion_terms_fmriprep, motion_directions)
-    ):
-        mapping[f"RP.{i_iter+1}"] = f"{term}_{direction}"
-        mapping[f"RP^2.{i_iter+1}"] = f"{term}_{direction}_power2"
-        mapping[f"DRP.{i_iter+1}"] = f"{term}_{direction}_derivative1"
-        mapping[f"DRP^2.{i_iter+1}"] = f"{term}_{direction}_derivative1_power2"
-
-    return mapping
+    return ["juni_farm_hcp_common.py"]
 
 
 @register_datagrabber
-class HCPCATConfounds(PatternDataladDataGrabber):
+class HCPCATConfounds(HCPElementsMixin, PatternDataladDataGrabber):
     """Concrete implementation for CAT-processed HCP confounds.
 
     Parameters
@@ -84,51 +79,28 @@ class HCPCATConfounds(PatternDataladDataGrabber):
         **kwargs,
     ) -> None:
         """Initialise the class."""
-        # All tasks
-        all_tasks = [
-            "REST1",
-            "REST2",
-            "SOCIAL",
-            "WM",
-            "RELATIONAL",
-            "EMOTION",
-            "LANGUAGE",
-            "GAMBLING",
-            "MOTOR",
-        ]
-        # Set default tasks
-        if tasks is None:
-            self.tasks: List[str] = all_tasks
-        # Convert single task into list
-        else:
-            if not isinstance(tasks, List):
-                tasks = [tasks]
-
-            # Check for invalid task(s)
-            for task in tasks:
-                if task not in all_tasks:
-                    raise_error(
-                        f"'{task}' is not a valid HCP-YA fMRI task input. "
-                        f"Valid task values can be any or all of {all_tasks}."
-                    )
-            self.tasks: List[str] = tasks
-
-        # All phase encodings
-        all_phase_encodings = ["LR", "RL"]
-        # Set phase encodings
-        if phase_encodings is None:
-            phase_encodings = all_phase_encodings
-        # Convert single phase encoding into list
-        if isinstance(phase_encodings, str):
-            phase_encodings = [phase_encodings]
-        # Check for invalid phase encoding(s)
-        for pe in phase_encodings:
-            if pe not in all_phase_encodings:
-                raise_error(
-                    f"'{pe}' is not a valid HCP-YA phase encoding. "
-                    "Valid phase encoding can be any or all of "
-                    f"{all_phase_encodings}."
+        self.tasks: List[str] = parse_choices(
+            tasks, _ALL_TASKS, "fMRI task", "HCP-YA"
+        )
+
+        phase_encodings = parse_choices(
+            phase_encodings,
+            _ALL_PHASE_ENCODINGS,
+            "phase encoding",
+            "HCP-YA",
+        )
+
+        # Map task and phase encoding to their naming in the dataset;
+        # resting state files carry the preprocessing in the suffix
+        self._task_pe_map = {}
+        for task, pe in product(_ALL_TASKS, _ALL_PHASE_ENCODINGS):
+            if "REST" in task:
+                self._task_pe_map[(task, pe)] = (
+                    f"rfMRI{task}",
+                    f"{pe}hp2000clean",
                 )
+            else:
+                self._task_pe_map[(task, pe)] = (f"tfMRI{task}", pe)
 
         # The types of data
         types = ["BOLD"]
@@ -187,40 +159,34 @@ class HCPCATConfounds(PatternDataladDataGrabber):
             Dictionary of paths for each type of data required for the
             specified element.
         """
-        # Resting task
-        if "REST" in task:
-            new_task = f"rfMRI{task}"
-            new_phase_encoding = f"{phase_encoding}hp2000clean"
-        else:
-            new_task = f"tfMRI{task}"
-            new_phase_encoding = phase_encoding
-
+        new_task, new_phase_encoding = self._task_pe_map[
+            (task, phase_encoding)
+        ]
         return super().get_item(
             subject=subject, task=new_task, phase_encoding=new_phase_encoding
         )
 
-    def get_elements(self) -> List:
-        """Implement fetching list of elements in the dataset.
+    def _subject_from_entry(self, entry: os.DirEntry) -> Optional[str]:
+        """Get the subject ID of an entry in the data directory.
+
+        Parameters
+        ----------
+        entry : os.DirEntry
+            The entry in the data directory.
 
         Returns
         -------
-        list
-            The list of elements in the dataset.
-        """
-        # there are some .git folders in the dataset that will be picked up
-        # if we dont check whether "sub" is in name.
-        subjects = [
-            x.name.split("-")[1]
-            for x in self.datadir.iterdir()
-            if x.is_dir() and "sub" in x.name
-        ]
-        elems = []
-        for subject, task, phase_encoding in product(
-            subjects, self.tasks, self.phase_encodings
-        ):
-            elems.append((subject, task, phase_encoding))
+        str or None
+            The subject ID, or None if the entry is not a subject.
 
-        return elems
+        """
+        # there are some .git folders in the dataset that will be picked
+        # up if we dont check for the "sub-" prefix. is_dir() on a
+        # scandir entry uses the file type from the directory read, so
+        # it only costs a stat for symlinks.
+        if entry.name.startswith("sub-") and entry.is_dir():
+            return entry.name.split("-", 1)[1]
+        return None
 
 
 @register_datagrabber
@@ -329,16 +295,3 @@ class MultipleHCP(MultipleDataGrabber):
             datagrabbers=[dg1, dg2],
             **kwargs,
         )
-
-
-# test
-if __name__ == "__main__":
-    with MultipleHCP(tasks="REST1") as hcp_conf:
-        all_elements = hcp_conf.get_elements()
-
-        # this will run over all elements, so use keyboard interrupt
-        # if convinced that it works
-        for element in all_elements:
-            print(element)
-            out = hcp_conf[element]
-            print(out)
@@ -0,0 +1,251 @@
+"""Provide helpers shared by the HCP datagrabbers."""
+
+# Authors: Leonard Sasse <l.sasse@fz-juelich.de>
+# License: AGPL
+
+from abc import abstractmethod
+from functools import cached_property
+from itertools import product
+import os
+from sys import intern
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from junifer.utils import raise_error
+
+
+def parse_choices(
+    choices: Union[str, List[str], None],
+    all_choices: Tuple[str, ...],
+    name: str,
+    dataset: str,
+) -> List[str]:
+    """Normalise and validate a selection of tasks or phase encodings.
+
+    Parameters
+    ----------
+    choices : str or list of str or None
+        The selected value(s). If None, all values are selected.
+    all_choices : tuple of str
+        All valid values, in the order used for the default.
+    name : str
+        The name of the selection, used in the error message.
+    dataset : str
+        The name of the dataset, used in the error message.
+
+    Returns
+    -------
+    list of str
+        The selected values.
+
+    Raises
+    ------
+    ValueError
+        If any of ``choices`` is not a valid value. All invalid values
+        are listed in the message.
+
+    """
+    if choices is None:
+        return list(all_choices)
+    # Convert single value into list
+    if isinstance(choices, str):
+        choices = [choices]
+    # Check for invalid value(s); only str values can be valid, which also
+    # keeps unhashable values out of the set lookup
+    valid_choices = frozenset(all_choices)
+    invalid = [
+        choice
+        for choice in choices
+        if not isinstance(choice, str) or choice not in valid_choices
+    ]
+    if invalid:
+        raise_error(
+            f"Invalid {dataset} {name}(s): {invalid}. "
+            f"Valid {name} values can be any or all of "
+            f"{list(all_choices)}."
+        )
+    # Share the string objects with the module constants; str() turns str
+    # subclasses such as numpy.str_, which cannot be interned, into str
+    return [intern(str(choice)) for choice in choices]
+
+
+def _build_cat_to_fmriprep_mapping() -> Dict[str, str]:
+    """Build the mapping of CAT confound names to fMRIPrep confound names.
+
+    Returns
+    -------
+    dict
+        keys (CAT variables) and values (corresponding fMRIprep variables).
+
+    """
+    # overarching variables
+    terms_cat = ["WM", "CSF", "GS"]
+    terms_fmriprep = ["white_matter", "csf", "global_signal"]
+
+    mapping = {}
+
+    for cat, fmriprep in zip(terms_cat, terms_fmriprep):
+        mapping[cat] = fmriprep
+        mapping[f"{cat}^2"] = f"{fmriprep}_power2"
+
+    # take care of motion parameters
+    # TODO: Felix' dataset uses rigid body parameters 1 to 6 but i am not sure
+    # which number (1-6) correspnds to translations and rotations (and x, y, z)
+    # respectively; for regular confound removal this should not matter
+    # because all confounds will be selected and used in the regression
+    # but will be good to have this implemented correctly anyways
+    motion_terms_fmriprep = ["rot", "trans"]
+    motion_directions = ["x", "y", "z"]
+    motion_fmriprep = [
+        f"{term}_{direction}"
+        for term, direction in product(
+            motion_terms_fmriprep, motion_directions
+        )
+    ]
+    # CAT prefix and fMRIPrep suffix of each motion confound family
+    motion_families = [
+        ("RP", ""),
+        ("RP^2", "_power2"),
+        ("DRP", "_derivative1"),
+        ("DRP^2", "_derivative1_power2"),
+    ]
+    mapping.update(
+        {
+            f"{prefix}.{i_iter}": f"{fmriprep}{suffix}"
+            for prefix, suffix in motion_families
+            for i_iter, fmriprep in enumerate(motion_fmriprep, start=1)
+        }
+    )
+
+    return mapping
+
+
+# The mapping is static, so build it once at import
+_CAT_TO_FMRIPREP = _build_cat_to_fmriprep_mapping()
+
+
+def get_cat_to_fmriprep_mapping() -> Dict[str, str]:
+    """Map variables in CAT output to fmriprep variables.
+
+    Returns
+    -------
+    dict
+        keys (CAT variables) and values (corresponding fMRIprep variables).
+
+    Notes
+    -----
+    The mapping is built once at import. Each call returns a copy of it, so
+    the result can be modified without affecting other callers.
+
+    """
+    return dict(_CAT_TO_FMRIPREP)
+
+
+class HCPElementsMixin:
+    """Mixin for datagrabbers with (subject, task, phase encoding) elements.
+
+    The subjects are found by scanning the data directory once per instance.
+    Subclasses set the ``tasks`` and ``phase_encodings`` attributes and
+    implement ``_subject_from_entry()``.
+
+    """
+
+    @abstractmethod
+    def _subject_from_entry(self, entry: os.DirEntry) -> Optional[str]:
+        """Get the subject ID of an entry in the data directory.
+
+        Parameters
+        ----------
+        entry : os.DirEntry
+            The entry in the data directory.
+
+        Returns
+        -------
+        str or None
+            The subject ID, or None if the entry is not a subject.
+
+        """
+
+    @cached_property
+    def _subjects(self) -> List[str]:
+        """The subjects found in the dataset.
+
+        Returns
+        -------
+        list of str
+            The subject IDs.
+
+        """
+        with os.scandir(self.datadir) as entries:
+            subjects = [self._subject_from_entry(x) for x in entries]
+        return [intern(x) for x in subjects if x is not None]
+
+    def invalidate_subjects_cache(self) -> None:
+        """Forget the subjects found in the dataset.
+
+        The next call to ``get_elements()`` or ``iter_elements()`` scans the
+        data directory again, e.g. to pick up newly added subjects.
+
+        """
+        self.__dict__.pop("_subjects", None)
+
+    def iter_elements(self) -> Iterator[Tuple[str, str, str]]:
+        """Iterate over the elements in the dataset.
+
+        Unlike ``get_elements()``, this does not build the list of elements.
+
+        Returns
+        -------
+        iterator of tuple of str
+            The (subject, task, phase encoding) elements, in the same order
+            as ``get_elements()``.
+
+        """
+        return product(self._subjects, self.tasks, self.phase_encodings)
+
+    def get_elements(self) -> List:
+        """Implement fetching list of elements in the dataset.
+
+        Returns
+        -------
+        list
+            The list of elements in the dataset.
+
+        Notes
+        -----
+        The data directory is scanned for subjects once per instance, see
+        ``invalidate_subjects_cache()``.
+
+        """
+        return list(self.iter_elements())
+
+    def get_elements_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the elements in the dataset as parallel arrays.
+
+        Returns
+        -------
+        subjects : np.ndarray of str
+            The subject of each element.
+        tasks : np.ndarray of str
+            The task of each element.
+        phase_encodings : np.ndarray of str
+            The phase encoding of each element.
+
+        Notes
+        -----
+        The arrays follow the order of ``get_elements()``, so a boolean mask
+        built from one of them (e.g. ``tasks == "REST1"``) selects the
+        matching elements without iterating in Python. They are built from
+        the subjects, tasks and phase encodings directly, without creating
+        the element tuples.
+
+        """
+        grids = np.meshgrid(
+            np.array(self._subjects, dtype=str),
+            np.array(self.tasks, dtype=str),
+            np.array(self.phase_encodings, dtype=str),
+            indexing="ij",
+        )
+        subjects, tasks, phase_encodings = (grid.ravel() for grid in grids)
+        return subjects, tasks, phase_encodings
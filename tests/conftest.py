@@ -0,0 +1,14 @@
+"""Provide fixtures and configuration for the datagrabber tests."""
+
+# Authors: Leonard Sasse <l.sasse@fz-juelich.de>
+# License: AGPL
+
+from pathlib import Path
+import sys
+
+
+# The datagrabbers are loaded by junifer as standalone files and import
+# their sibling modules by name, so make the sibling modules importable.
+sys.path.insert(
+    0, str(Path(__file__).parent.parent / "juni_farm" / "datagrabber")
+)
@@ -0,0 +1,261 @@
+"""Provide tests for the HCP-YA concatenation helpers."""
+
+# Authors: Leonard Sasse <l.sasse@fz-juelich.de>
+# License: AGPL
+
+from pathlib import Path
+from typing import List, Optional
+
+import nibabel as nib
+import numpy as np
+import pytest
+from hcp_ya_concatenated import (
+    HCP_YA_Concatenated,
+    _concat_bolds,
+    _concat_confounds,
+)
+
+
+def _make_bolds(
+    tmp_path: Path,
+    dtypes: List[type],
+    scaled: bool = False,
+    extension: bool = False,
+) -> List[Path]:
+    """Save synthetic 4D images with differing numbers of timepoints.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+    dtypes : list of type
+        The on-disk dtype of each image.
+    scaled : bool, optional
+        Whether to store float data in the dtypes, so that nibabel writes
+        scale factors (default False).
+    extension : bool, optional
+        Whether to add a header extension to the first image (default
+        False).
+
+    Returns
+    -------
+    list of pathlib.Path
+        The paths of the saved images.
+
+    """
+    rng = np.random.default_rng(42)
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    paths = []
+    for i_img, dtype in enumerate(dtypes):
+        shape = (3, 4, 5, 6 + i_img)
+        if scaled:
+            data = rng.normal(100, 20, size=shape)
+        else:
+            data = rng.integers(-1000, 1000, size=shape).astype(dtype)
+        img = nib.Nifti1Image(data, affine)
+        img.set_data_dtype(dtype)
+        if extension and i_img == 0:
+            img.header.extensions.append(
+                nib.nifti1.Nifti1Extension("comment", b"juni-farm test")
+            )
+        path = tmp_path / f"bold_{i_img}.nii.gz"
+        nib.save(img, path)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("suffix", [".nii", ".nii.gz"])
+@pytest.mark.parametrize(
+    "dtypes, scaled, extension",
+    [
+        ([np.int16, np.int16, np.int16], False, False),
+        ([np.float32, np.float32], False, False),
+        ([np.int16, np.int16], True, False),
+        ([np.int16, np.float32, np.int16], False, False),
+        ([np.int16, np.int16], False, True),
+    ],
+)
+def test_concat_bolds(
+    tmp_path: Path,
+    suffix: str,
+    dtypes: List[type],
+    scaled: bool,
+    extension: bool,
+) -> None:
+    """Test BOLD concatenation against nibabel's concat_images.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+    suffix : str
+        The parametrized suffix of the output file.
+    dtypes : list of type
+        The parametrized on-disk dtype of each image.
+    scaled : bool
+        The parametrized flag for scaled images.
+    extension : bool
+        The parametrized flag for a header extension.
+
+    """
+    paths = _make_bolds(tmp_path, dtypes, scaled=scaled, extension=extension)
+    fname = tmp_path / f"concat_bold{suffix}"
+    _concat_bolds(paths, fname)
+
+    out = nib.load(fname)
+    expected = nib.concat_images(paths, axis=3)
+    assert out.shape == expected.shape
+    assert np.allclose(out.affine, expected.affine)
+    assert np.allclose(out.get_fdata(), expected.get_fdata())
+    # The data follows the header and its extensions
+    ext_size = sum(ext.get_sizeondisk() for ext in out.header.extensions)
+    assert out.dataobj.offset == 352 + ext_size
+
+
+def _save_img(
+    path: Path, shape: tuple, affine: Optional[np.ndarray] = None
+) -> None:
+    """Save a zero-filled image.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The path to save the image to.
+    shape : tuple
+        The shape of the image.
+    affine : np.ndarray, optional
+        The affine of the image. If None, the identity is used (default
+        None).
+
+    """
+    if affine is None:
+        affine = np.eye(4)
+    nib.save(nib.Nifti1Image(np.zeros(shape, dtype=np.int16), affine), path)
+
+
+def test_concat_bolds_not_4d(tmp_path: Path) -> None:
+    """Test BOLD concatenation with a 3D first image.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+
+    """
+    _save_img(tmp_path / "bold_0.nii", (3, 4, 5))
+    _save_img(tmp_path / "bold_1.nii", (3, 4, 5, 6))
+    with pytest.raises(ValueError, match="is not a 4D image"):
+        _concat_bolds(
+            [tmp_path / "bold_0.nii", tmp_path / "bold_1.nii"],
+            tmp_path / "concat_bold.nii",
+        )
+
+
+@pytest.mark.parametrize(
+    "shape, affine",
+    [
+        ((3, 4, 5), None),
+        ((3, 4, 6, 6), None),
+        ((3, 4, 5, 6), np.diag([2.0, 2.0, 2.0, 1.0])),
+    ],
+)
+def test_concat_bolds_mismatch(
+    tmp_path: Path, shape: tuple, affine: Optional[np.ndarray]
+) -> None:
+    """Test BOLD concatenation with images of differing geometry.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+    shape : tuple
+        The parametrized shape of the second image.
+    affine : np.ndarray or None
+        The parametrized affine of the second image.
+
+    """
+    _save_img(tmp_path / "bold_0.nii", (3, 4, 5, 6))
+    _save_img(tmp_path / "bold_1.nii", shape, affine)
+    with pytest.raises(ValueError, match="does not match the 4D geometry"):
+        _concat_bolds(
+            [tmp_path / "bold_0.nii", tmp_path / "bold_1.nii"],
+            tmp_path / "concat_bold.nii",
+        )
+
+
+@pytest.mark.parametrize("max_workers", [0, -1, 2.0, "2", None])
+def test_hcp_ya_concatenated_invalid_max_workers(max_workers: object) -> None:
+    """Test HCP_YA_Concatenated with invalid max_workers.
+
+    Parameters
+    ----------
+    max_workers : object
+        The parametrized invalid number of workers.
+
+    """
+    with pytest.raises(ValueError, match="max_workers must be a positive"):
+        HCP_YA_Concatenated(max_workers=max_workers)
+
+
+@pytest.mark.parametrize("newline", [b"\n", b"\r\n"])
+def test_concat_confounds(tmp_path: Path, newline: bytes) -> None:
+    """Test confound concatenation.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+    newline : bytes
+        The parametrized line ending of the input files.
+
+    """
+    contents = [
+        [b"WM\tCSF", b"1\t2", b"3\t4"],
+        [b"WM\tCSF", b"5\t6"],
+    ]
+    paths = []
+    for i_file, lines in enumerate(contents):
+        path = tmp_path / f"confounds_{i_file}.tsv"
+        # The last file lacks a trailing line ending
+        end = newline if i_file < len(contents) - 1 else b""
+        path.write_bytes(newline.join(lines) + end)
+        paths.append(path)
+    fname = tmp_path / "concat_confounds.tsv"
+    _concat_confounds(paths, fname)
+    assert fname.read_bytes() == b"WM\tCSF\n1\t2\n3\t4\n5\t6\n"
+
+
+def test_concat_confounds_empty(tmp_path: Path) -> None:
+    """Test confound concatenation with an empty first file.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+
+    """
+    (tmp_path / "confounds_0.tsv").write_bytes(b"")
+    (tmp_path / "confounds_1.tsv").write_bytes(b"WM\tCSF\n1\t2\n")
+    with pytest.raises(ValueError, match="has no header"):
+        _concat_confounds(
+            [tmp_path / "confounds_0.tsv", tmp_path / "confounds_1.tsv"],
+            tmp_path / "concat_confounds.tsv",
+        )
+
+
+def test_concat_confounds_mismatch(tmp_path: Path) -> None:
+    """Test confound concatenation with differing columns.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        The path to the test directory.
+
+    """
+    (tmp_path / "confounds_0.tsv").write_bytes(b"WM\tCSF\n1\t2\n")
+    (tmp_path / "confounds_1.tsv").write_bytes(b"WM\tGS\n1\t2\n")
+    with pytest.raises(ValueError, match="do not have the same columns"):
+        _concat_confounds(
+            [tmp_path / "confounds_0.tsv", tmp_path / "confounds_1.tsv"],
+            tmp_path / "concat_confounds.tsv",
+        )
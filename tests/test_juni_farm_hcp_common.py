@@ -0,0 +1,67 @@
+"""Provide tests for the helpers shared by the HCP datagrabbers."""
+
+# Authors: Leonard Sasse <l.sasse@fz-juelich.de>
+# License: AGPL
+
+from typing import List, Union
+
+import numpy as np
+import pytest
+from juni_farm_hcp_common import parse_choices
+
+
+_ALL_TASKS = ("REST1", "REST2", "WM")
+
+
+@pytest.mark.parametrize(
+    "choices, expected",
+    [
+        (None, ["REST1", "REST2", "WM"]),
+        ("WM", ["WM"]),
+        (["REST2", "REST1"], ["REST2", "REST1"]),
+        (list(np.array(["WM", "REST1"])), ["WM", "REST1"]),
+    ],
+)
+def test_parse_choices(
+    choices: Union[str, List[str], None], expected: List[str]
+) -> None:
+    """Test parsing valid selections.
+
+    Parameters
+    ----------
+    choices : str or list of str or None
+        The parametrized selection.
+    expected : list of str
+        The parametrized expected selection.
+
+    """
+    parsed = parse_choices(choices, _ALL_TASKS, "fMRI task", "HCP")
+    assert parsed == expected
+    # The parsed values are the module constants
+    assert all(type(choice) is str for choice in parsed)
+    assert all(
+        any(choice is task for task in _ALL_TASKS) for choice in parsed
+    )
+
+
+@pytest.mark.parametrize(
+    "choices, match",
+    [
+        ("REST3", r"Invalid HCP fMRI task\(s\): \['REST3'\]"),
+        (["REST1", 1, "Z"], r"Invalid HCP fMRI task\(s\): \[1, 'Z'\]"),
+        ([["REST1"]], r"Invalid HCP fMRI task\(s\): \[\['REST1'\]\]"),
+    ],
+)
+def test_parse_choices_invalid(choices: list, match: str) -> None:
+    """Test parsing invalid selections.
+
+    Parameters
+    ----------
+    choices : list
+        The parametrized invalid selection.
+    match : str
+        The parametrized pattern of the error message.
+
+    """
+    with pytest.raises(ValueError, match=match):
+        parse_choices(choices, _ALL_TASKS, "fMRI task", "HCP")